@@ -1,16 +1,21 @@
 import os
+import json
+import math
 import time
-import cv2
+import threading
 import board
 import busio
 import adafruit_ads1x15.ads1115 as ADS
 from adafruit_ads1x15.analog_in import AnalogIn
-from azure.storage.blob import BlobServiceClient
-from azure.data.tables import TableServiceClient
+from collections import deque
 from datetime import datetime
 from dotenv import load_dotenv
 import RPi.GPIO as GPIO
 import logging
+from sensor_trace import SensorTraceRecorder
+
+# Reference point for the startup benchmark
+boot_started = time.perf_counter()
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
@@ -22,31 +27,128 @@ azure_logger.setLevel(logging.WARNING)
 # Load environment variables
 load_dotenv()
 
-# Initialize Azure Blob Storage and Table Storage clients
-# Please prepare your connection string to Azure Storage Account
-connect_str = os.getenv("connection_string")
-blob_service_client = BlobServiceClient.from_connection_string(connect_str)
-asset_container_name = 'assets'
-device_container_name = 'devicetest01' # Change the container name into yours
-asset_container_client = blob_service_client.get_container_client(asset_container_name)
-device_container_client = blob_service_client.get_container_client(device_container_name)
-
-# Azure Table Storage setup
-table_service = TableServiceClient.from_connection_string(connect_str)
-table_name = 'DeviceTest01' # Change the table name into yours
-table_client = table_service.get_table_client(table_name)
-
-# Ensure the table exists, create if not
-try:
-    table_client.create_table()
-except Exception as e:
-    logging.info("Table already exists or another error occurred:", e)
-
 # Setup GPIO for LED control
 LED_PIN = 17  # GPIO pin to which the LED strip is connected
 GPIO.setmode(GPIO.BCM)
 GPIO.setup(LED_PIN, GPIO.OUT)
 
+# Initialize I2C interface and ADS1115
+i2c = busio.I2C(board.SCL, board.SDA)
+ads = ADS.ADS1115(i2c)
+
+# Define the analog input channels
+channel1 = AnalogIn(ads, ADS.P0)
+channel2 = AnalogIn(ads, ADS.P1)
+
+# Record IR samples into a rotating binary trace instead of logging every reading
+SAMPLE_INTERVAL = 0.05  # Seconds between sensor samples
+CHECK_INTERVAL = 5  # Seconds between detection checks. You can change the number to change the detection frequency
+os.makedirs(os.getenv("save_path"), exist_ok=True)
+trace_path = os.getenv("trace_path", os.path.join(os.getenv("save_path"), "sensor_trace.bin"))
+recorder = SensorTraceRecorder(trace_path, capacity=100000, pre_samples=200, post_samples=200)
+
+# OpenCV, the detection functions and the Azure clients are loaded on a background thread so sensing starts immediately
+# Please prepare your connection string to Azure Storage Account
+cv2 = None
+detection = None
+blob_service_client = None
+asset_container_client = None
+device_container_client = None
+table_client = None
+asset_container_name = 'assets'
+device_container_name = 'devicetest01' # Change the container name into yours
+table_name = 'DeviceTest01' # Change the table name into yours
+cloud_ready = threading.Event()
+
+# Detection can split each frame into this many strips processed on separate cores; 1 runs the single-pass version
+# The speedup has not been measured on the Pi yet, so the single pass stays the default (try detection_tiles=4)
+DETECTION_TILES = int(os.getenv("detection_tiles", "1"))
+
+# Optional second stage rejecting stones, twigs and soil clumps among the candidate blobs (see train_classifier.py)
+CANDIDATE_CLASSIFIER = os.getenv("candidate_classifier")
+CANDIDATE_CLASSIFIER_OUTPUTS = os.getenv("candidate_classifier_outputs")  # 'logits' or 'probabilities' for a cv2.dnn model
+classifier = None
+
+# Motion gate on the camera preview, loaded with OpenCV; triggers go straight to full capture until then
+MOTION_GATE = os.getenv("motion_gate", "true").lower() == "true"
+MOTION_GATE_ROI = os.getenv("motion_gate_roi")  # left,top,right,bottom as fractions of the frame; defaults to the detection crop
+motion_gate = None
+
+# Captures taken before the cloud clients are ready, processed once they are
+MAX_PENDING_CAPTURES = 50
+pending_captures = deque(maxlen=MAX_PENDING_CAPTURES)
+
+# Delta upload mode: upload only changed tiles, or a heartbeat when nothing changed
+DELTA_UPLOAD = os.getenv("delta_upload", "false").lower() == "true"
+TILE_SIZE = 256  # Tile edge length in pixels
+TILE_CHANGE_PIXELS = 200  # Minimum changed pixels for a tile to be uploaded
+MAX_DELTA_FRACTION = 0.25  # Above this fraction of changed tiles a full image is uploaded instead
+
+# Last fully uploaded image (keyframe) that tiles and heartbeats refer to
+delta_state = {
+    'keyframe': None,
+    'keyframe_name': None,
+    'keyframe_url': None,
+    'heartbeat_key': None,
+    'quiet_count': 0
+}
+
+# Function to switch the LED strip, which lights the enclosed trap for the camera
+def set_led(on):
+    GPIO.output(LED_PIN, GPIO.HIGH if on else GPIO.LOW)
+
+# Function to import OpenCV and the Azure SDKs and build the clients, retrying until the network is up
+def initialize_cloud_clients():
+    global cv2, detection, classifier, motion_gate, blob_service_client, asset_container_client, device_container_client, table_client
+    import cv2 as cv2_module
+    import weevil_detection
+    from azure.core.exceptions import ResourceExistsError
+    from azure.storage.blob import BlobServiceClient
+    from azure.data.tables import TableServiceClient
+    cv2 = cv2_module
+    detection = weevil_detection
+
+    if CANDIDATE_CLASSIFIER:
+        try:
+            from candidate_classifier import load_classifier
+            classifier = load_classifier(CANDIDATE_CLASSIFIER, CANDIDATE_CLASSIFIER_OUTPUTS)
+        except Exception as e:
+            logging.error(f"Candidate classifier unavailable, counting every candidate blob: {e}")
+
+    if MOTION_GATE:
+        try:
+            from motion_gate import MotionGate
+            roi = tuple(float(value) for value in MOTION_GATE_ROI.split(",")) if MOTION_GATE_ROI else None
+            motion_gate = MotionGate(roi, light=set_led)
+        except Exception as e:
+            logging.error(f"Motion gate unavailable, every trigger will do a full capture: {e}")
+
+    connect_str = os.getenv("connection_string")
+    retry_delay = 5
+    while True:
+        try:
+            blob_service = BlobServiceClient.from_connection_string(connect_str)
+            table_service = TableServiceClient.from_connection_string(connect_str)
+            table = table_service.get_table_client(table_name)
+
+            # Ensure the table exists, create if not
+            try:
+                table.create_table()
+            except ResourceExistsError:
+                logging.info("Table already exists")
+            break
+        except Exception as e:
+            logging.error(f"Error initializing cloud clients, retrying in {retry_delay} s: {e}")
+            time.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, 300)
+
+    blob_service_client = blob_service
+    asset_container_client = blob_service.get_container_client(asset_container_name)
+    device_container_client = blob_service.get_container_client(device_container_name)
+    table_client = table
+    cloud_ready.set()
+    logging.info(f"Cloud clients ready after {time.perf_counter() - boot_started:.2f} s")
+
 # Function to check for the trigger file
 def check_for_trigger_file():
     try:
@@ -99,120 +201,208 @@ def upload_file_and_save_metadata(file_path, description, weevil_count):
         logging.error(f"Error uploading file and saving metadata: {e}")
         return None, None
 
-# Function to capture images using Raspberry Pi's camera
-def capture_image(previous_image=None):
+# Function to upload a full image and keep it as the keyframe for later delta uploads
+def upload_keyframe(file_path, image, description, weevil_count):
+    blob_url, metadata = upload_file_and_save_metadata(file_path, description, weevil_count)
+    if blob_url is not None:
+        delta_state['keyframe'] = image
+        delta_state['keyframe_name'] = os.path.basename(file_path)
+        delta_state['keyframe_url'] = blob_url
+        delta_state['heartbeat_key'] = None
+        delta_state['quiet_count'] = 0
+    return blob_url, metadata
+
+# Function to find the tiles of a binary difference image that changed
+def find_changed_tiles(diff_image):
+    height, width = diff_image.shape[:2]
+    tiles = []
+    for y in range(0, height, TILE_SIZE):
+        for x in range(0, width, TILE_SIZE):
+            tile = diff_image[y:y + TILE_SIZE, x:x + TILE_SIZE]
+            if cv2.countNonZero(tile) >= TILE_CHANGE_PIXELS:
+                tiles.append((x, y, tile.shape[1], tile.shape[0]))
+    return tiles
+
+# Function to upload only the changed tiles of an image and store their coordinates in Azure Table Storage
+def upload_tiles_and_save_metadata(file_path, image, tiles, description, weevil_count):
+    try:
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        tile_entries = []
+        for x, y, w, h in tiles:
+            success, encoded = cv2.imencode(".jpg", image[y:y + h, x:x + w])
+            if not success:
+                raise ValueError(f"Failed to encode tile at ({x}, {y})")
+            blob_client = blob_service_client.get_blob_client(container=device_container_name, blob=f"{name}_tile_{x}_{y}.jpg")
+            blob_client.upload_blob(encoded.tobytes(), overwrite=True)
+            tile_entries.append({'x': x, 'y': y, 'w': w, 'h': h, 'url': blob_client.url})
+
+        timestamp = datetime.utcnow().isoformat() + 'Z'
+        height, width = image.shape[:2]
+
+        # ImageUrl points at the keyframe so the dashboard can paste the tiles over it
+        metadata = {
+            'PartitionKey': 'ImageDescription',
+            'RowKey': os.path.basename(file_path),
+            'Description': description,
+            'ImageUrl': delta_state['keyframe_url'],
+            'FileName': delta_state['keyframe_name'],
+            'TS': timestamp,
+            'Weevil_number': weevil_count,
+            'UploadMode': 'delta',
+            'ImageWidth': width,
+            'ImageHeight': height,
+            'Tiles': json.dumps(tile_entries)
+        }
+        table_client.upsert_entity(entity=metadata)
+
+        delta_state['heartbeat_key'] = None
+        delta_state['quiet_count'] = 0
+        logging.info(f"Uploaded {len(tiles)} changed tiles for {file_path}")
+        return delta_state['keyframe_url'], metadata
+    except Exception as e:
+        logging.error(f"Error uploading tiles and saving metadata: {e}")
+        return None, None
+
+# Function to record a quiet capture without uploading any image
+def save_heartbeat(file_path):
+    try:
+        # One heartbeat entity per quiet period, updated in place with the number of quiet captures
+        if delta_state['heartbeat_key'] is None:
+            delta_state['heartbeat_key'] = "heartbeat_" + os.path.basename(file_path)
+            delta_state['quiet_count'] = 0
+        delta_state['quiet_count'] += 1
+
+        timestamp = datetime.utcnow().isoformat() + 'Z'
+        metadata = {
+            'PartitionKey': 'ImageDescription',
+            'RowKey': delta_state['heartbeat_key'],
+            'Description': f"Time: {time.strftime('%H:%M:%S')}\nNo change ({delta_state['quiet_count']} quiet captures)",
+            'ImageUrl': delta_state['keyframe_url'],
+            'FileName': delta_state['keyframe_name'],
+            'TS': timestamp,
+            'Weevil_number': 0,
+            'UploadMode': 'heartbeat',
+            'QuietCaptures': delta_state['quiet_count']
+        }
+        table_client.upsert_entity(entity=metadata)
+
+        logging.info(f"No change detected, heartbeat saved ({delta_state['quiet_count']} quiet captures)")
+        return delta_state['keyframe_url'], metadata
+    except Exception as e:
+        logging.error(f"Error saving heartbeat: {e}")
+        return None, None
+
+# Function to upload a capture as a heartbeat, changed tiles or a full image depending on how much changed
+def upload_capture_delta(file_path, image, description, weevil_count):
+    keyframe = delta_state['keyframe']
+    if keyframe is None or keyframe.shape != image.shape:
+        return upload_keyframe(file_path, image, description, weevil_count)
+
+    # Tiles are always relative to the keyframe so one base image is enough to rebuild the view
+    _, diff = detection.compare_images(keyframe, image)
+    tiles = find_changed_tiles(diff)
+    height, width = diff.shape[:2]
+    total_tiles = math.ceil(height / TILE_SIZE) * math.ceil(width / TILE_SIZE)
+
+    if not tiles:
+        if weevil_count == 0:
+            return save_heartbeat(file_path)
+        return upload_keyframe(file_path, image, description, weevil_count)
+    if len(tiles) > MAX_DELTA_FRACTION * total_tiles:
+        return upload_keyframe(file_path, image, description, weevil_count)
+    return upload_tiles_and_save_metadata(file_path, image, tiles, description, weevil_count)
+
+# Function to capture a still using Raspberry Pi's camera, returns the file name or None
+def take_still():
     save_path = os.getenv("save_path")
     os.makedirs(save_path, exist_ok=True)
     
     filename = os.path.join(save_path, time.strftime("%Y%m%d-%H%M%S") + ".jpg")
     command = f"libcamera-still -o '{filename}' --autofocus-mode auto --tuning-file /usr/share/libcamera/ipa/rpi/vc4/imx477_af.json"
     
+    # Turn on the LED before capturing the image
+    GPIO.output(LED_PIN, GPIO.HIGH)
+    logging.info("LED on")
+    
+    # Wait for 2 seconds
+    time.sleep(2)
+    
+    logging.info(f"Executing command: {command}")
+    os.system(command)
+    
+    # Turn off the LED after capturing the image
+    GPIO.output(LED_PIN, GPIO.LOW)
+    logging.info("LED off")
+    
+    if os.path.exists(filename) and os.path.isfile(filename):
+        logging.info(f"Captured {filename}")
+        return filename
+    logging.error(f"Image file {filename} does not exist or is not a file")
+    return None
+
+# Function to count the weevils in a full frame, tiled across cores when enabled
+def count_weevils(image):
+    if DETECTION_TILES > 1:
+        return detection.process_image_tiled(image, os.getenv("save_path"), DETECTION_TILES, classifier)
+    return detection.process_image(image, os.getenv("save_path"), classifier)
+
+# Function to count the weevils in a captured image and upload it
+def process_capture(filename, previous_image=None, captured_at=None):
+    captured_at = captured_at or time.strftime('%H:%M:%S')
     try:
-        # Turn on the LED before capturing the image
-        GPIO.output(LED_PIN, GPIO.HIGH)
-        logging.info("LED on")
-        
-        # Wait for 2 seconds
-        time.sleep(2)
-        
-        logging.info(f"Executing command: {command}")
-        os.system(command)
-        
-        # Turn off the LED after capturing the image
-        GPIO.output(LED_PIN, GPIO.LOW)
-        logging.info("LED off")
-        
-        if os.path.exists(filename) and os.path.isfile(filename):
-            logging.info(f"Captured {filename}")
-            current_image = cv2.imread(filename)
-            if current_image is not None:
-                if previous_image is not None:
-                    similarity, diff = compare_images(previous_image, current_image)
-                    if similarity > 0.97:
-                        count = count_new_weevils(diff)
-                        description = f"Time: {time.strftime('%H:%M:%S')}\nPest category: Weevil\nNew weevils found: {count}"
-                    else:
-                        count = process_image(current_image)
-                        description = f"Time: {time.strftime('%H:%M:%S')}\nPest category: Weevil\nNumber: {count}"
+        current_image = cv2.imread(filename)
+        if current_image is not None:
+            if previous_image is not None:
+                similarity, diff = detection.compare_images(previous_image, current_image)
+                if similarity > 0.97:
+                    count = detection.count_new_weevils(diff)
+                    description = f"Time: {captured_at}\nPest category: Weevil\nNew weevils found: {count}"
                 else:
-                    count = process_image(current_image)
-                    description = f"Time: {time.strftime('%H:%M:%S')}\nPest category: Weevil\nNumber: {count}"
-                    
-                upload_file_and_save_metadata(filename, description, count)
-                logging.info(f"Processed and uploaded {filename}: {count} weevils found")
+                    count = count_weevils(current_image)
+                    description = f"Time: {captured_at}\nPest category: Weevil\nNumber: {count}"
             else:
-                logging.error(f"Failed to load image {filename}")
+                count = count_weevils(current_image)
+                description = f"Time: {captured_at}\nPest category: Weevil\nNumber: {count}"
+                
+            if DELTA_UPLOAD:
+                upload_capture_delta(filename, current_image, description, count)
+            else:
+                upload_file_and_save_metadata(filename, description, count)
+            logging.info(f"Processed and uploaded {filename}: {count} weevils found")
         else:
-            logging.error(f"Image file {filename} does not exist or is not a file")
+            logging.error(f"Failed to load image {filename}")
 
         return current_image
     except Exception as e:
-        logging.error(f"Error capturing image: {e}")
+        logging.error(f"Error processing image: {e}")
         return previous_image
 
-# Function to compare images
-def compare_images(imageA, imageB):
-    grayA = cv2.cvtColor(imageA, cv2.COLOR_BGR2GRAY)
-    grayB = cv2.cvtColor(imageB, cv2.COLOR_BGR2GRAY)
-    diff = cv2.absdiff(grayA, grayB)
-    _, diff = cv2.threshold(diff, 60, 255, cv2.THRESH_BINARY)
-    similarity = 1 - (cv2.countNonZero(diff) / diff.size)
-    return similarity, diff
-
-# Function to count new weevils based on image differencing
-def count_new_weevils(diff_image):
-    contours, _ = cv2.findContours(diff_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    min_area = 27785  # Minimum area to be considered a weevil
-    max_area = 266000  # Maximum area to be considered a weevil
-    new_weevil_count = 0
-
-    for contour in contours:
-        area = cv2.contourArea(contour)
-        if min_area < area < max_area:
-            new_weevil_count += 1
-
-    return new_weevil_count
-
-def crop_center_square(image):
-    # Get image dimensions
-    height, width = image.shape[:2]
-    
-    # Coordinates for cropping (these should be adjusted based on your specific image)
-    top = 150  # Adjust as needed
-    bottom = height - 400  # Adjust as needed
-    left = 100  # Adjust as needed
-    right = width - 100  # Adjust as needed
-    
-    # Print dimensions for debugging
-    print(f"Image dimensions: height={height}, width={width}")
-    print(f"Cropping to: top={top}, bottom={bottom}, left={left}, right={right}")
-    
-    # Crop the image to the desired region
-    cropped_img = image[top:bottom, left:right]
-    
-    return cropped_img
-
-
-# Function to process an image and count the weevils
-def process_image(image):
-    cropped_image = crop_center_square(image)
-    gray = cv2.cvtColor(cropped_image, cv2.COLOR_BGR2GRAY)
-    _, thresh = cv2.threshold(gray, 60, 255, cv2.THRESH_BINARY_INV)
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
-    min_area = 27785  # Minimum area to be considered a weevil
-    max_area = 266000  # Maximum area to be considered a weevil
-    weevil_count = 0
+# Function to capture images, buffering them until the cloud clients are ready
+def capture_image(previous_image=None):
+    try:
+        filename = take_still()
+    except Exception as e:
+        logging.error(f"Error capturing image: {e}")
+        return previous_image
+    if filename is None:
+        return previous_image
 
-    for contour in contours:
-        area = cv2.contourArea(contour)
-        if min_area < area < max_area:
-            weevil_count += 1
+    captured_at = time.strftime('%H:%M:%S')
+    # Keep buffering while older captures are still pending, so captures are always compared in capture order
+    if not cloud_ready.is_set() or pending_captures:
+        if len(pending_captures) == MAX_PENDING_CAPTURES:
+            logging.warning(f"Capture buffer full, dropping oldest buffered capture {pending_captures[0][0]}")
+        pending_captures.append((filename, captured_at))
+        reason = "Cloud clients not ready" if not cloud_ready.is_set() else "Older captures pending"
+        logging.info(f"{reason}, buffered {filename} ({len(pending_captures)} pending)")
+        return previous_image
+    return process_capture(filename, previous_image, captured_at)
 
-    processed_filename = os.path.join(os.getenv("save_path"), "processed_" + time.strftime("%Y%m%d-%H%M%S") + ".jpg")
-    cv2.imwrite(processed_filename, thresh)
-    return weevil_count
+# Function to process one of the captures buffered while the cloud clients were starting, oldest first
+def process_pending_capture(previous_image):
+    filename, captured_at = pending_captures.popleft()
+    logging.info(f"Processing buffered capture {filename} ({len(pending_captures)} still pending)")
+    return process_capture(filename, previous_image, captured_at)
 
 # Function to calculate distance from sensor voltage
 def get_distance(voltage):
@@ -226,37 +416,65 @@ def get_distance(voltage):
         distance = 30
     return distance
 
-# Initialize I2C interface and ADS1115
-i2c = busio.I2C(board.SCL, board.SDA)
-ads = ADS.ADS1115(i2c)
+# Start OpenCV and the cloud clients in the background so sensing is not delayed by the network
+threading.Thread(target=initialize_cloud_clients, daemon=True).start()
+
+# Latest IR sample, written by the sampling thread and read by the detection loop
+latest_sample = {'voltages': None}
+sample_ready = threading.Event()
+stop_sampling = threading.Event()
+
+# Function to sample the sensors on a dedicated thread, so the trace keeps filling while a capture blocks the detection loop
+def sample_sensors():
+    while not stop_sampling.is_set():
+        try:
+            voltage1 = channel1.voltage
+            voltage2 = channel2.voltage
+        except Exception as e:
+            logging.error(f"Error reading sensors: {e}")
+        else:
+            recorder.record(voltage1, voltage2)
+            latest_sample['voltages'] = (voltage1, voltage2)
+            if not sample_ready.is_set():
+                logging.info(f"First sensor sample after {time.perf_counter() - boot_started:.3f} s")
+                sample_ready.set()
+        stop_sampling.wait(SAMPLE_INTERVAL)
 
-# Define the analog input channels
-channel1 = AnalogIn(ads, ADS.P0)
-channel2 = AnalogIn(ads, ADS.P1)
+sampler = threading.Thread(target=sample_sensors, daemon=True)
+sampler.start()
 
-# Main loop to read sensors and capture images if a pest is detected
+# Main loop to check the latest sample and capture images if a pest is detected
 previous_image = None
-while True:
-    voltage1 = channel1.voltage
-    distance1 = get_distance(voltage1)
-    voltage2 = channel2.voltage
-    distance2 = get_distance(voltage2)
-
-    # Print distances
-    logging.info(f"Sensor 1: Voltage: {voltage1:.2f} V, Distance: {distance1:.2f} cm")
-    logging.info(f"Sensor 2: Voltage: {voltage2:.2f} V, Distance: {distance2:.2f} cm")
-
-    # Check if trigger file exists
-    if check_for_trigger_file():
-        logging.info("Trigger file detected! Capturing image.")
-        previous_image = capture_image(previous_image)
-        delete_trigger_file()
-    elif distance1 < 9.5 or distance2 < 9.5:
-        logging.info("Pest detected! Triggering camera.")
-        previous_image = capture_image(previous_image)
-    
-    time.sleep(5)  # Delay for 5 seconds. You can change the number to change the detection frequency
-
-# Cleanup GPIO settings before exiting
-GPIO.cleanup()
-
+try:
+    sample_ready.wait()
+    while True:
+        voltage1, voltage2 = latest_sample['voltages']
+        distance1 = get_distance(voltage1)
+        distance2 = get_distance(voltage2)
+        logging.debug(f"Sensor 1: Voltage: {voltage1:.2f} V, Distance: {distance1:.2f} cm")
+        logging.debug(f"Sensor 2: Voltage: {voltage2:.2f} V, Distance: {distance2:.2f} cm")
+
+        # Drain the buffer one capture per check so a long backlog does not hold up the trigger checks
+        if cloud_ready.is_set() and pending_captures:
+            previous_image = process_pending_capture(previous_image)
+
+        # Check if trigger file exists
+        if cloud_ready.is_set() and check_for_trigger_file():
+            logging.info("Trigger file detected! Capturing image.")
+            recorder.trigger()
+            previous_image = capture_image(previous_image)
+            delete_trigger_file()
+        elif distance1 < 9.5 or distance2 < 9.5:
+            logging.info(f"IR trigger. Distances: {distance1:.2f} cm, {distance2:.2f} cm")
+            recorder.trigger()
+            if motion_gate is None or motion_gate.confirm():
+                logging.info("Pest detected! Triggering camera.")
+                previous_image = capture_image(previous_image)
+
+        time.sleep(CHECK_INTERVAL)
+finally:
+    # Stop sampling, then cleanup GPIO settings and flush the trace before exiting
+    stop_sampling.set()
+    sampler.join()
+    recorder.close()
+    GPIO.cleanup()
@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import argparse
+import logging
+import threading
+import numpy as np
+import cv2
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from dotenv import load_dotenv
+from weevil_detection import process_image
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+
+# Suppress detailed logs from azure
+azure_logger = logging.getLogger('azure.core.pipeline.policies.http_logging_policy')
+azure_logger.setLevel(logging.WARNING)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+TABLE_BATCH_LIMIT = 100  # Azure Table transactions hold at most 100 entities
+DIFFERENCE_MARKER = "New weevils found"  # Description of rows whose count is a difference to the previous capture
+
+
+# Images stored in the device blob container
+class BlobSource(object):
+
+    def __init__(self, container_client):
+        self.container_client = container_client
+
+    def list_names(self):
+        for blob in self.container_client.list_blobs():
+            yield blob.name
+
+    def read(self, name):
+        return self.container_client.download_blob(name).readall()
+
+
+# Local directory standing in for the device blob container
+class DirectorySource(object):
+
+    def __init__(self, path):
+        self.path = path
+
+    def list_names(self):
+        for name in sorted(os.listdir(self.path)):
+            if os.path.isfile(os.path.join(self.path, name)):
+                yield name
+
+    def read(self, name):
+        with open(os.path.join(self.path, name), "rb") as f:
+            return f.read()
+
+
+# Corrected counts merged into existing rows of the Azure table, leaving the other fields untouched
+class TableSink(object):
+
+    def __init__(self, table_client):
+        from azure.data.tables import UpdateMode
+        self.table_client = table_client
+        self.mode = UpdateMode.MERGE
+
+    # Descriptions of the rows the device wrote, keyed by RowKey; read once per run
+    def existing_rows(self):
+        rows = self.table_client.query_entities("PartitionKey eq 'ImageDescription'", select=['RowKey', 'Description'])
+        return {row['RowKey']: row.get('Description') or '' for row in rows}
+
+    def update(self, results):
+        for start in range(0, len(results), TABLE_BATCH_LIMIT):
+            operations = [
+                ("update", {'PartitionKey': 'ImageDescription', 'RowKey': name, 'Weevil_number': count}, {"mode": self.mode})
+                for name, count in results[start:start + TABLE_BATCH_LIMIT]
+            ]
+            self.table_client.submit_transaction(operations)
+
+
+# JSON lines file standing in for the Azure table
+class JsonlSink(object):
+
+    def __init__(self, path):
+        self.path = path
+
+    # No table to check against, so every capture is written
+    def existing_rows(self):
+        return None
+
+    def update(self, results):
+        with open(self.path, "a") as f:
+            for name, count in results:
+                f.write(json.dumps({'RowKey': name, 'Weevil_number': count}) + "\n")
+
+
+# Function to load the names already written by an earlier run
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return set(line.strip() for line in f if line.strip())
+
+
+# Function to record names whose counts have been written
+def save_checkpoint(path, names):
+    with open(path, "a") as f:
+        for name in names:
+            f.write(name + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# Function to pick the original captures out of the container, skipping delta tiles
+def is_capture(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS) and "_tile_" not in name and not name.startswith("processed_")
+
+
+# Function to decide whether a capture should get a full-frame count, given the rows the device wrote
+def should_recount(name, rows):
+    if rows is None:
+        return True
+    # Captures without a row (e.g. a failed table write) are not recreated as stub rows, and rows holding a
+    # difference count keep it, since a full-frame total there would be added on top of the earlier captures
+    return name in rows and DIFFERENCE_MARKER not in rows[name]
+
+
+# Optional candidate classifier, loaded once in every worker process
+classifier = None
+
+
+# Function run when a worker process starts
+def init_worker(classifier_path, classifier_outputs=None):
+    global classifier
+    if classifier_path:
+        from candidate_classifier import load_classifier
+        classifier = load_classifier(classifier_path, classifier_outputs)
+
+
+# Function run in the worker processes: decode an image and count the weevils with the current logic
+def count_weevils(data):
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    return process_image(image, classifier=classifier)
+
+
+# Function to recompute Weevil_number for every archived capture
+def run_backfill(source, sink, checkpoint_path, workers=None, download_concurrency=8, batch_size=100, classifier_path=None,
+                 classifier_outputs=None):
+    done = load_checkpoint(checkpoint_path)
+    if done:
+        logging.info(f"Resuming, {len(done)} images already processed")
+    rows = sink.existing_rows()
+
+    download_slots = threading.Semaphore(download_concurrency)
+    max_in_flight = download_concurrency + (workers or os.cpu_count() or 1) * 2
+    started = time.perf_counter()
+    processed = 0
+    failed = 0
+    skipped = 0
+    batch = []
+
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(classifier_path, classifier_outputs)) as pool, ThreadPoolExecutor(max_in_flight) as threads:
+
+        def download_and_count(name):
+            with download_slots:
+                data = source.read(name)
+            return name, pool.submit(count_weevils, data).result()
+
+        def collect(finished):
+            nonlocal failed
+            for future in finished:
+                try:
+                    name, count = future.result()
+                except Exception as e:
+                    logging.error(f"Error reprocessing image: {e}")
+                    failed += 1
+                    continue
+                if count is None:
+                    logging.error(f"Failed to decode {name}")
+                    failed += 1
+                    continue
+                batch.append((name, count))
+
+            if len(batch) >= batch_size:
+                flush()
+
+        def flush():
+            nonlocal processed, batch
+            if not batch:
+                return
+            sink.update(batch)
+            save_checkpoint(checkpoint_path, [name for name, _ in batch])
+            processed += len(batch)
+            batch = []
+            elapsed = time.perf_counter() - started
+            logging.info(f"{processed} images reprocessed, {processed / elapsed:.2f} images/s")
+
+        in_flight = set()
+        for name in source.list_names():
+            if name in done or not is_capture(name):
+                continue
+            if not should_recount(name, rows):
+                skipped += 1
+                continue
+            # Keep the number of downloaded-but-unprocessed images bounded
+            if len(in_flight) >= max_in_flight:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(finished)
+            in_flight.add(threads.submit(download_and_count, name))
+
+        collect(in_flight)
+        flush()
+
+    elapsed = time.perf_counter() - started
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    logging.info(f"Backfill finished: {processed} images in {elapsed:.1f} s ({rate:.2f} images/s), {failed} failed, "
+                 f"{skipped} skipped (no table row or a difference count)")
+    return processed, failed
+
+
+if __name__ == "__main__":
+    # Load environment variables before the defaults below read them
+    load_dotenv()
+    connect_str = os.getenv("connection_string")
+
+    parser = argparse.ArgumentParser(description="Recompute Weevil_number for archived images with the current detection logic")
+    parser.add_argument("--local-dir", help="Read images from this directory instead of the blob container")
+    parser.add_argument("--output", help="Write counts to this JSON lines file instead of the table")
+    parser.add_argument("--container", default="devicetest01")
+    parser.add_argument("--table", default="DeviceTest01")
+    parser.add_argument("--checkpoint", default="backfill_checkpoint.txt")
+    parser.add_argument("--workers", type=int, default=None, help="Detection processes (default: one per core)")
+    parser.add_argument("--download-concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--classifier", default=os.getenv("candidate_classifier"), help="Candidate classifier used on the device, if any")
+    parser.add_argument("--classifier-outputs", default=os.getenv("candidate_classifier_outputs"), choices=["logits", "probabilities"],
+                        help="What a cv2.dnn classifier returns")
+    args = parser.parse_args()
+
+    if args.local_dir:
+        source = DirectorySource(args.local_dir)
+    else:
+        from azure.storage.blob import BlobServiceClient
+        source = BlobSource(BlobServiceClient.from_connection_string(connect_str).get_container_client(args.container))
+
+    if args.output:
+        sink = JsonlSink(args.output)
+    else:
+        from azure.data.tables import TableServiceClient
+        sink = TableSink(TableServiceClient.from_connection_string(connect_str).get_table_client(args.table))
+
+    run_backfill(source, sink, args.checkpoint, args.workers, args.download_concurrency, args.batch_size, args.classifier,
+                 args.classifier_outputs)
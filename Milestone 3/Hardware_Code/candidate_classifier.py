@@ -0,0 +1,112 @@
+import json
+import numpy as np
+import cv2
+
+# Scale-free shape and texture features, so blobs from the calibration pictures and the trap compare directly
+FEATURE_NAMES = ['elongation', 'solidity', 'circularity', 'mean_grey', 'grey_std']
+
+
+# Function to compute the features of one candidate blob from its bounding-box crop
+def candidate_features(image, contour):
+    x, y, w, h = cv2.boundingRect(contour)
+    crop = image[y:y + h, x:x + w]
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    mask = np.zeros((h, w), dtype=np.uint8)
+    cv2.drawContours(mask, [contour], -1, 255, cv2.FILLED, offset=(-x, -y))
+
+    area = cv2.contourArea(contour)
+    perimeter = cv2.arcLength(contour, True)
+    hull_area = cv2.contourArea(cv2.convexHull(contour))
+    (_, _), (side_a, side_b), _ = cv2.minAreaRect(contour)
+    mean, std = cv2.meanStdDev(gray, mask=mask)
+
+    elongation = max(side_a, side_b) / max(min(side_a, side_b), 1.0)
+    solidity = area / hull_area if hull_area > 0 else 0.0
+    circularity = 4 * np.pi * area / (perimeter * perimeter) if perimeter > 0 else 0.0
+    return [elongation, solidity, circularity, mean[0][0] / 255.0, std[0][0] / 255.0]
+
+
+# Logistic model over handcrafted features, scored for all candidates in one matrix product
+class FeatureClassifier(object):
+
+    def __init__(self, weights, bias, mean, scale, threshold=0.5):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.threshold = threshold
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            params = json.load(f)
+        return cls(params['weights'], params['bias'], params['mean'], params['scale'], params.get('threshold', 0.5))
+
+    def save(self, path):
+        params = {
+            'features': FEATURE_NAMES,
+            'weights': self.weights.tolist(),
+            'bias': self.bias,
+            'mean': self.mean.tolist(),
+            'scale': self.scale.tolist(),
+            'threshold': self.threshold
+        }
+        with open(path, "w") as f:
+            json.dump(params, f, indent=2)
+
+    def probabilities(self, features):
+        z = ((np.asarray(features, dtype=np.float64) - self.mean) / self.scale) @ self.weights + self.bias
+        return 1.0 / (1.0 + np.exp(-z))
+
+    # Return a boolean per candidate contour, True where it looks like a weevil
+    def predict(self, image, contours):
+        if not contours:
+            return np.zeros(0, dtype=bool)
+        features = np.array([candidate_features(image, contour) for contour in contours])
+        return self.probabilities(features) >= self.threshold
+
+
+# Small CNN (e.g. an int8-quantized ONNX export) run through cv2.dnn on all candidate crops in one forward pass
+class DnnClassifier(object):
+
+    # outputs says what the model returns: 'logits', or 'probabilities' when it ends in softmax or sigmoid
+    def __init__(self, model_path, outputs, input_size=(64, 64), weevil_class=1, threshold=0.5):
+        if outputs not in ('logits', 'probabilities'):
+            raise ValueError(f"Model outputs must be 'logits' or 'probabilities', got {outputs!r}")
+        self.net = cv2.dnn.readNet(model_path)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.input_size = input_size
+        self.weevil_class = weevil_class
+        self.threshold = threshold
+        self.outputs = outputs
+
+    # Weevil probability per candidate from the raw network output
+    def weevil_probabilities(self, scores):
+        if self.outputs == 'probabilities':
+            return scores[:, 0] if scores.shape[1] == 1 else scores[:, self.weevil_class]
+        if scores.shape[1] == 1:
+            return 1.0 / (1.0 + np.exp(-scores[:, 0]))
+        scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+        return (scores / scores.sum(axis=1, keepdims=True))[:, self.weevil_class]
+
+    # Return a boolean per candidate contour, True where it looks like a weevil
+    def predict(self, image, contours):
+        if not contours:
+            return np.zeros(0, dtype=bool)
+        crops = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            crops.append(image[y:y + h, x:x + w])
+        blob = cv2.dnn.blobFromImages(crops, 1.0 / 255, self.input_size, swapRB=True)
+        self.net.setInput(blob)
+        scores = self.net.forward().reshape(len(crops), -1)
+        return self.weevil_probabilities(scores) >= self.threshold
+
+
+# Function to load a classifier from a JSON feature model or any model file cv2.dnn can read;
+# a cv2.dnn model also needs its outputs ('logits' or 'probabilities'), as they cannot be told from the scores
+def load_classifier(path, outputs=None):
+    if path.endswith(".json"):
+        return FeatureClassifier.load(path)
+    return DnnClassifier(path, outputs)
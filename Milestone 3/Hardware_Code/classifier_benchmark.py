@@ -0,0 +1,74 @@
+import glob
+import os
+import time
+import argparse
+import statistics
+import numpy as np
+import cv2
+from candidate_classifier import load_classifier
+from train_classifier import CALIBRATION_DIR, load_dataset, fit_logistic
+
+
+# Function to gather real candidate blobs (image, contour) from the calibration pictures
+def load_candidates(calibration_dir):
+    candidates = []
+    for path in sorted(glob.glob(os.path.join(calibration_dir, "**", "*.*"), recursive=True)):
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if contours:
+            candidates.append((image, max(contours, key=cv2.contourArea)))
+    return candidates
+
+
+# Function to paste n candidate crops onto one frame, as the candidates of a single capture would be
+def build_frame(candidates, n, width=4056):
+    placed = []
+    x = y = row_height = 0
+    for i in range(n):
+        image, contour = candidates[i % len(candidates)]
+        left, top, w, h = cv2.boundingRect(contour)
+        if x + w > width:
+            x, y, row_height = 0, y + row_height, 0
+        placed.append((image[top:top + h, left:left + w], contour - (left, top) + (x, y), x, y))
+        x += w
+        row_height = max(row_height, h)
+    frame = np.full((y + row_height, width, 3), 255, dtype=np.uint8)
+    for crop, _, x, y in placed:
+        frame[y:y + crop.shape[0], x:x + crop.shape[1]] = crop
+    return frame, [contour for _, contour, _, _ in placed]
+
+
+# Function to time one batched classification of n candidates, returns the median seconds per candidate
+def time_batch(classifier, candidates, n, repeats):
+    frame, contours = build_frame(candidates, n)
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        classifier.predict(frame, contours)
+        timings.append((time.perf_counter() - started) / n)
+    return statistics.median(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the candidate classifier latency per candidate on CPU")
+    parser.add_argument("--model", help="Classifier to load (.json feature model or a cv2.dnn model); fitted on the calibration pictures if omitted")
+    parser.add_argument("--model-outputs", choices=["logits", "probabilities"], help="What a cv2.dnn model returns")
+    parser.add_argument("--calibration-dir", default=CALIBRATION_DIR)
+    parser.add_argument("--batch-sizes", default="1,8,32,128")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.model:
+        classifier = load_classifier(args.model, args.model_outputs)
+    else:
+        classifier = fit_logistic(*load_dataset(args.calibration_dir))
+
+    candidates = load_candidates(args.calibration_dir)
+    print(f"{len(candidates)} candidate blobs, {cv2.getNumThreads()} OpenCV threads")
+    for n in (int(size) for size in args.batch_sizes.split(",")):
+        per_candidate = time_batch(classifier, candidates, n, args.repeats)
+        print(f"Batch of {n}: {per_candidate * 1000:.3f} ms per candidate")
@@ -0,0 +1,85 @@
+import logging
+import cv2
+from RpiCamera import Camera
+from weevil_detection import detection_roi
+
+
+# Cheap confirmation stage on the 640x360 preview stream before the full still/detect/upload path
+class MotionGate(object):
+
+    def __init__(self, roi=None, frames=5, pixel_threshold=25, motion_fraction=0.01, width=640, height=360,
+                 light=None, warmup_frames=10):
+        # Region of interest as fractions (left, top, right, bottom) of the preview frame, by default the area detection counts
+        self.roi = roi or detection_roi()
+        self.frames = frames  # Preview frames grabbed per check
+        self.light = light  # Function switching the trap LED on (True) or off (False); the trap is dark without it
+        self.warmup_frames = warmup_frames  # Frames discarded while exposure and white balance settle
+        self.pixel_threshold = pixel_threshold  # Grey level change for a pixel to count as changed
+        self.motion_fraction = motion_fraction  # Fraction of changed ROI pixels that confirms motion
+        self.width = width
+        self.height = height
+        self.checks = 0
+        self.escalated = 0
+        self._background = None  # ROI seen at the end of the previous check
+
+    # Crop the ROI out of a preview frame and convert it to a blurred greyscale image
+    def roi_gray(self, frame):
+        height, width = frame.shape[:2]
+        left, top, right, bottom = self.roi
+        roi = frame[int(top * height):int(bottom * height), int(left * width):int(right * width)]
+        if roi.ndim == 3:
+            roi = cv2.cvtColor(roi, cv2.COLOR_BGRA2GRAY if roi.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(roi, (5, 5), 0)
+
+    # Fraction of pixels that changed between two ROI images
+    def changed_fraction(self, imageA, imageB):
+        diff = cv2.absdiff(imageA, imageB)
+        _, diff = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        return cv2.countNonZero(diff) / diff.size
+
+    # Motion is confirmed when consecutive frames differ, or the scene differs from the last check
+    def detect_motion(self, rois):
+        references = list(zip(rois, rois[1:]))
+        if self._background is not None:
+            references.append((self._background, rois[-1]))
+        else:
+            # Nothing to compare a still scene against yet, so let the first trigger through
+            return True
+        return any(self.changed_fraction(a, b) > self.motion_fraction for a, b in references)
+
+    def grab_rois(self):
+        # The camera is released after every check so libcamera-still can use it for the full capture
+        if self.light is not None:
+            self.light(True)
+        camera = Camera(self.width, self.height)
+        try:
+            camera.start_preview()
+            # Exposure and white balance settle over the first frames, which would otherwise read as motion
+            for _ in range(self.warmup_frames):
+                camera.getFrame()
+            return [self.roi_gray(camera.getFrame()) for _ in range(self.frames)]
+        finally:
+            camera.stop_preview()
+            camera.close()
+            if self.light is not None:
+                self.light(False)
+
+    def confirm(self):
+        self.checks += 1
+        try:
+            rois = self.grab_rois()
+            motion = self.detect_motion(rois)
+            self._background = rois[-1]
+        except Exception as e:
+            logging.error(f"Motion gate failed, escalating to full capture: {e}")
+            motion = True
+
+        if motion:
+            self.escalated += 1
+        logging.info(f"Motion gate {'confirmed' if motion else 'rejected'} trigger: "
+                     f"hit rate {self.hit_rate():.0%} ({self.escalated}/{self.checks}), "
+                     f"{self.checks - self.escalated} heavy captures saved")
+        return motion
+
+    def hit_rate(self):
+        return self.escalated / self.checks if self.checks else 0.0
@@ -0,0 +1,106 @@
+import os
+import time
+import threading
+import numpy as np
+
+# One record per sample: timestamp plus the voltage of both IR channels
+SAMPLE_DTYPE = np.dtype([('t', '<f8'), ('v1', '<f4'), ('v2', '<f4')])
+
+# File header: magic, capacity in samples, total samples ever written
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('capacity', '<u8'), ('written', '<u8')])
+MAGIC = b'IRTRACE1'
+
+
+# Ring buffer of sensor samples kept in a fixed-size memory-mapped file, safe to record from a sampling thread
+class SensorTraceRecorder(object):
+
+    def __init__(self, path, capacity=100000, pre_samples=200, post_samples=200, snapshot_dir=None, flush_every=100):
+        self.path = path
+        self.pre_samples = pre_samples
+        self.post_samples = post_samples
+        self.snapshot_dir = snapshot_dir or os.path.dirname(os.path.abspath(path))
+        self.flush_every = flush_every
+        self._pending = []  # Triggers still waiting for their post-trigger samples
+        self._lock = threading.RLock()
+
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        size = HEADER_DTYPE.itemsize + capacity * SAMPLE_DTYPE.itemsize
+        reuse = os.path.exists(path) and os.path.getsize(path) == size
+        if not reuse:
+            with open(path, "wb") as f:
+                f.truncate(size)
+
+        self._header = np.memmap(path, dtype=HEADER_DTYPE, mode="r+", shape=(1,))
+        self._samples = np.memmap(path, dtype=SAMPLE_DTYPE, mode="r+", offset=HEADER_DTYPE.itemsize, shape=(capacity,))
+        if not reuse or self._header['magic'][0] != MAGIC or self._header['capacity'][0] != capacity:
+            self._header['magic'] = MAGIC
+            self._header['capacity'] = capacity
+            self._header['written'] = 0
+            self._header.flush()
+
+        self.capacity = capacity
+        self.written = int(self._header['written'][0])
+
+    def record(self, voltage1, voltage2, timestamp=None):
+        with self._lock:
+            index = self.written % self.capacity
+            self._samples[index] = (time.time() if timestamp is None else timestamp, voltage1, voltage2)
+            self.written += 1
+            self._header['written'] = self.written
+
+            if self.written % self.flush_every == 0:
+                self.flush()
+            if self._pending and self.written >= self._pending[0][1]:
+                self._write_snapshots()
+
+    # Mark a capture event; the snapshot is written once the post-trigger window is filled
+    def trigger(self, label=None):
+        label = label or time.strftime("%Y%m%d-%H%M%S")
+        with self._lock:
+            self._pending.append((label, self.written + self.post_samples, self.written))
+
+    # Return the samples with sequence numbers in [start, end) that are still in the buffer
+    def window(self, start, end):
+        with self._lock:
+            start = max(start, self.written - self.capacity, 0)
+            end = min(end, self.written)
+            if end <= start:
+                return np.empty(0, dtype=SAMPLE_DTYPE)
+            indices = np.arange(start, end) % self.capacity
+            return np.array(self._samples[indices])
+
+    def _write_snapshots(self):
+        while self._pending and self.written >= self._pending[0][1]:
+            label, end, trigger_at = self._pending.pop(0)
+            snapshot = self.window(trigger_at - self.pre_samples, end)
+            np.save(os.path.join(self.snapshot_dir, f"trace_{label}.npy"), snapshot)
+
+    def flush(self):
+        with self._lock:
+            self._samples.flush()
+            self._header.flush()
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            del self._samples
+            del self._header
+
+
+# Function to load a ring buffer file into a numpy array in chronological order
+def load_trace(path):
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)[0]
+    if header['magic'] != MAGIC:
+        raise ValueError(f"{path} is not a sensor trace file")
+    capacity = int(header['capacity'])
+    written = int(header['written'])
+    samples = np.fromfile(path, dtype=SAMPLE_DTYPE, count=capacity, offset=HEADER_DTYPE.itemsize)
+    if written <= capacity:
+        return samples[:written]
+    start = written % capacity
+    return np.concatenate((samples[start:], samples[:start]))
+
+
+# Function to load a pre/post-trigger snapshot saved around a capture event
+def load_snapshot(path):
+    return np.load(path)
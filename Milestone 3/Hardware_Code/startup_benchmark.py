@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+import statistics
+
+# Log lines printed by MainFunction.py at each startup milestone
+FIRST_SAMPLE_MARKER = "First sensor sample after"
+CLOUD_READY_MARKER = "Cloud clients ready after"
+
+
+# Function to start MainFunction.py once and time how long it takes to reach each milestone
+def run_once(script, timeout):
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-u", script], cwd=os.path.dirname(os.path.abspath(script)),
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    first_sample = None
+    cloud_ready = None
+    try:
+        for line in process.stdout:
+            elapsed = time.perf_counter() - started
+            if first_sample is None and FIRST_SAMPLE_MARKER in line:
+                first_sample = elapsed
+            if cloud_ready is None and CLOUD_READY_MARKER in line:
+                cloud_ready = elapsed
+            if (first_sample is not None and cloud_ready is not None) or elapsed > timeout:
+                break
+    finally:
+        process.terminate()
+        process.wait()
+    return first_sample, cloud_ready
+
+
+# Function to print min/median/max of a list of timings
+def report(name, timings):
+    timings = [t for t in timings if t is not None]
+    if not timings:
+        print(f"{name}: not reached")
+        return
+    print(f"{name}: min {min(timings):.3f} s, median {statistics.median(timings):.3f} s, max {max(timings):.3f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure cold-start-to-first-sample time of MainFunction.py")
+    parser.add_argument("--script", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "MainFunction.py"))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    first_samples = []
+    cloud_readies = []
+    for run in range(args.runs):
+        first_sample, cloud_ready = run_once(args.script, args.timeout)
+        print(f"Run {run + 1}: first sample {first_sample}, cloud ready {cloud_ready}")
+        first_samples.append(first_sample)
+        cloud_readies.append(cloud_ready)
+
+    report("Cold start to first sample", first_samples)
+    report("Cold start to cloud clients ready", cloud_readies)
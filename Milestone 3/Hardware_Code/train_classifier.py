@@ -0,0 +1,90 @@
+import os
+import glob
+import argparse
+import numpy as np
+import cv2
+from candidate_classifier import FeatureClassifier, candidate_features
+
+# Calibration folders next to the code, labelled 1 for weevils and 0 for look-alikes
+CALIBRATION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Pictures for grayscale caliboration")
+WEEVIL_FOLDERS = ["pics for greyscale-weevils，leaf，soil/weevils"]
+OTHER_FOLDERS = [
+    "pics for greyscale-weevils，leaf，soil/dry leaves",
+    "pics for greyscale-weevils，leaf，soil/soil clumps",
+    "pics for Small Stones, Twigs and Branches, Crop Residue"
+]
+
+
+# Function to find the main dark object of a calibration picture and return its features
+def picture_features(path):
+    image = cv2.imread(path)
+    if image is None:
+        return None
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    return candidate_features(image, max(contours, key=cv2.contourArea))
+
+
+# Function to collect features and labels from the calibration folders
+def load_dataset(calibration_dir):
+    features = []
+    labels = []
+    for label, folders in ((1, WEEVIL_FOLDERS), (0, OTHER_FOLDERS)):
+        for folder in folders:
+            for path in sorted(glob.glob(os.path.join(calibration_dir, folder, "*"))):
+                row = picture_features(path)
+                if row is not None:
+                    features.append(row)
+                    labels.append(label)
+    return np.array(features), np.array(labels, dtype=np.float64)
+
+
+# Function to fit an L2-regularised logistic regression with classes weighted equally
+def fit_logistic(features, labels, l2=0.1, steps=5000, learning_rate=0.1):
+    mean = features.mean(axis=0)
+    scale = features.std(axis=0) + 1e-9
+    x = (features - mean) / scale
+    sample_weights = np.where(labels == 1, 0.5 / labels.sum(), 0.5 / (len(labels) - labels.sum()))
+    weights = np.zeros(x.shape[1])
+    bias = 0.0
+    for _ in range(steps):
+        p = 1.0 / (1.0 + np.exp(-(x @ weights + bias)))
+        error = (p - labels) * sample_weights
+        weights -= learning_rate * (x.T @ error + l2 * weights / len(labels))
+        bias -= learning_rate * error.sum()
+    return FeatureClassifier(weights, bias, mean, scale)
+
+
+# Function to report leave-one-out accuracy per class
+def leave_one_out(features, labels):
+    correct = {0: 0, 1: 0}
+    for i in range(len(labels)):
+        keep = np.arange(len(labels)) != i
+        model = fit_logistic(features[keep], labels[keep])
+        predicted = model.probabilities(features[i:i + 1])[0] >= model.threshold
+        correct[int(labels[i])] += int(predicted == labels[i])
+    return correct[1] / labels.sum(), correct[0] / (len(labels) - labels.sum())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit the candidate classifier on the calibration pictures")
+    parser.add_argument("--calibration-dir", default=CALIBRATION_DIR)
+    parser.add_argument("--output", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "candidate_classifier.json"))
+    parser.add_argument("--loo", action="store_true", help="Also report leave-one-out accuracy")
+    args = parser.parse_args()
+
+    features, labels = load_dataset(args.calibration_dir)
+    print(f"{int(labels.sum())} weevil and {int(len(labels) - labels.sum())} look-alike pictures")
+    if args.loo:
+        weevil_recall, other_rejection = leave_one_out(features, labels)
+        print(f"Leave-one-out: {weevil_recall:.0%} of weevils kept, {other_rejection:.0%} of look-alikes rejected")
+        if weevil_recall < 0.95:
+            print(f"Warning: this model would drop {1 - weevil_recall:.0%} of real weevils from the counts; "
+                  f"do not enable it on the device until it keeps at least 95%")
+
+    model = fit_logistic(features, labels)
+    model.save(args.output)
+    print(f"Saved {args.output}")
@@ -0,0 +1,191 @@
+import os
+import time
+import bisect
+import logging
+import numpy as np
+import cv2
+from concurrent.futures import ThreadPoolExecutor
+
+MIN_AREA = 27785  # Minimum area to be considered a weevil
+MAX_AREA = 266000  # Maximum area to be considered a weevil
+THRESHOLD = 60  # Grey level below which a pixel is treated as part of a weevil
+
+# Margins cut off a full still by crop_center_square, in pixels of the still size they were tuned for
+CROP_TOP = 150
+CROP_BOTTOM = 400
+CROP_LEFT = 100
+CROP_RIGHT = 100
+STILL_SIZE = (4056, 3040)  # libcamera-still resolution of the HQ camera
+
+# Threads shared by the tiled detection, keyed by strip count; OpenCV releases the GIL so the strips run on separate cores
+_tile_pools = {}
+
+# Function to compare images
+def compare_images(imageA, imageB):
+    grayA = cv2.cvtColor(imageA, cv2.COLOR_BGR2GRAY)
+    grayB = cv2.cvtColor(imageB, cv2.COLOR_BGR2GRAY)
+    diff = cv2.absdiff(grayA, grayB)
+    _, diff = cv2.threshold(diff, 60, 255, cv2.THRESH_BINARY)
+    similarity = 1 - (cv2.countNonZero(diff) / diff.size)
+    return similarity, diff
+
+# Function to count new weevils based on image differencing
+def count_new_weevils(diff_image):
+    contours, _ = cv2.findContours(diff_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    new_weevil_count = 0
+
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if MIN_AREA < area < MAX_AREA:
+            new_weevil_count += 1
+
+    return new_weevil_count
+
+# Function to crop the image to the trap platform
+def crop_center_square(image):
+    # Get image dimensions
+    height, width = image.shape[:2]
+    
+    # Coordinates for cropping (these should be adjusted based on your specific image)
+    top = CROP_TOP  # Adjust as needed
+    bottom = height - CROP_BOTTOM  # Adjust as needed
+    left = CROP_LEFT  # Adjust as needed
+    right = width - CROP_RIGHT  # Adjust as needed
+    
+    # Log dimensions for debugging
+    logging.debug(f"Image dimensions: height={height}, width={width}")
+    logging.debug(f"Cropping to: top={top}, bottom={bottom}, left={left}, right={right}")
+    
+    # Crop the image to the desired region
+    cropped_img = image[top:bottom, left:right]
+    
+    return cropped_img
+
+# Function to return the area counted by crop_center_square as fractions (left, top, right, bottom) of the frame
+def detection_roi(width=STILL_SIZE[0], height=STILL_SIZE[1]):
+    return (CROP_LEFT / width, CROP_TOP / height, 1 - CROP_RIGHT / width, 1 - CROP_BOTTOM / height)
+
+
+# Function to process an image and count the weevils, saving the thresholded image if save_path is given
+def process_image(image, save_path=None, classifier=None):
+    cropped_image = crop_center_square(image)
+    gray = cv2.cvtColor(cropped_image, cv2.COLOR_BGR2GRAY)
+    _, thresh = cv2.threshold(gray, THRESHOLD, 255, cv2.THRESH_BINARY_INV)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    
+    candidates = []
+
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if MIN_AREA < area < MAX_AREA:
+            candidates.append(contour)
+
+    save_processed_image(thresh, save_path)
+    return count_candidates(cropped_image, candidates, classifier)
+
+# Function to count the candidate blobs, keeping only those the optional classifier accepts
+def count_candidates(cropped_image, candidates, classifier=None):
+    if classifier is None or not candidates:
+        return len(candidates)
+    return int(np.count_nonzero(classifier.predict(cropped_image, candidates)))
+
+# Function to save the thresholded image next to the captures
+def save_processed_image(thresh, save_path):
+    if save_path:
+        processed_filename = os.path.join(save_path, "processed_" + time.strftime("%Y%m%d-%H%M%S") + ".jpg")
+        cv2.imwrite(processed_filename, thresh)
+
+# Threshold one strip into its slice of the full mask; return its weevils and the extents of blobs cut by a seam
+def _detect_strip(cropped_image, thresh, top, bottom):
+    gray = cv2.cvtColor(cropped_image[top:bottom], cv2.COLOR_BGR2GRAY)
+    cv2.threshold(gray, THRESHOLD, 255, cv2.THRESH_BINARY_INV, dst=thresh[top:bottom])
+    contours, _ = cv2.findContours(thresh[top:bottom], cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(0, top))
+
+    if not contours:
+        return [], []
+
+    # Extent of every contour at once; a blob touching a seam row may continue in the next strip
+    lengths = np.fromiter(map(len, contours), dtype=np.intp, count=len(contours))
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    points = np.concatenate(contours)[:, 0]
+    first_cols = np.minimum.reduceat(points[:, 0], starts)
+    last_cols = np.maximum.reduceat(points[:, 0], starts)
+    first_rows = np.minimum.reduceat(points[:, 1], starts)
+    last_rows = np.maximum.reduceat(points[:, 1], starts)
+    cut = ((first_rows == top) & (top > 0)) | ((last_rows == bottom - 1) & (bottom < thresh.shape[0]))
+
+    weevils = []
+    for i in np.flatnonzero(~cut):
+        if MIN_AREA < cv2.contourArea(contours[i]) < MAX_AREA:
+            weevils.append((contours[i], cv2.boundingRect(contours[i])))
+    cut_extents = np.stack((first_cols, last_cols + 1, first_rows, last_rows + 1), axis=1)[cut].tolist()
+    return weevils, cut_extents
+
+# Whether the rows y to y + h cover one of the rows on either side of a seam
+def _touches_seam(y, h, seam_rows):
+    i = bisect.bisect_left(seam_rows, y)
+    return i < len(seam_rows) and seam_rows[i] < y + h
+
+# Function to count the weevils on horizontal strips in parallel; gives the same count as process_image
+def process_image_tiled(image, save_path=None, tiles=4, classifier=None):
+    cropped_image = crop_center_square(image)
+    height, width = cropped_image.shape[:2]
+    tiles = max(1, min(tiles, height))
+    if tiles not in _tile_pools:
+        _tile_pools[tiles] = ThreadPoolExecutor(max_workers=tiles)
+    pool = _tile_pools[tiles]
+
+    edges = [height * i // tiles for i in range(tiles + 1)]
+    seams = edges[1:-1]
+    seam_rows = [row for seam in seams for row in (seam - 1, seam)]
+
+    # Threshold and trace every strip in parallel
+    thresh = np.empty((height, width), dtype=np.uint8)
+    strips = pool.map(lambda i: _detect_strip(cropped_image, thresh, edges[i], edges[i + 1]), range(tiles))
+    inner = []
+    cut_extents = []
+    for weevils, extents in strips:
+        inner.extend(weevils)
+        cut_extents.extend(extents)
+
+    # Blobs cut by a seam are traced again inside rectangles holding all their pieces; rectangles
+    # never share columns, so every blob crossing a seam lies wholly inside exactly one of them
+    regions = []
+    for left, right, top, bottom in sorted(cut_extents):
+        if regions and left <= regions[-1][1]:
+            region = regions[-1]
+            region[1] = max(region[1], right)
+            region[2] = min(region[2], top)
+            region[3] = max(region[3], bottom)
+        else:
+            regions.append([left, right, top, bottom])
+
+    def trace_region(region):
+        left, right, top, bottom = region
+        contours, _ = cv2.findContours(thresh[top:bottom, left:right], cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(left, top))
+        return contours
+
+    candidates = []
+    straddling = []
+    for contours in pool.map(trace_region, regions):
+        for contour in contours:
+            # Only blobs crossing a seam come from the regions; their edges also cut through blobs already counted in the strips
+            x, y, w, h = cv2.boundingRect(contour)
+            if _touches_seam(y, h, seam_rows):
+                straddling.append((contour, (x, y, w, h)))
+                if MIN_AREA < cv2.contourArea(contour) < MAX_AREA:
+                    candidates.append(contour)
+
+    # A blob that is outermost in its strip is still nested if it sits in a hole of a blob crossing a seam
+    for contour, bbox in inner:
+        x, y = (int(v) for v in contour[0][0])
+        nested = any(
+            sx <= x < sx + sw and sy <= y < sy + sh and cv2.pointPolygonTest(outer, (x, y), False) > 0
+            for outer, (sx, sy, sw, sh) in straddling
+        )
+        if not nested:
+            candidates.append(contour)
+
+    save_processed_image(thresh, save_path)
+    return count_candidates(cropped_image, candidates, classifier)
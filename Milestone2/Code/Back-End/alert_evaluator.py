@@ -0,0 +1,285 @@
+import os
+import json
+import time
+import argparse
+import logging
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
+
+# Suppress detailed logs from azure
+azure_logger = logging.getLogger('azure.core.pipeline.policies.http_logging_policy')
+azure_logger.setLevel(logging.WARNING)
+
+# Alert rules, with the titles and severities the dashboard shows
+RULE_COUNT_HIGH = 'WeevilCountHigh'
+# The device writes entities only for captures, so a quiet period means no detections, not a lost connection
+RULE_QUIET = 'NoDetections'
+RULE_TITLES = {RULE_COUNT_HIGH: ('Weevil count high', 'High'), RULE_QUIET: ('No detections', 'Low')}
+
+
+# Function to convert an ISO 8601 TS value to seconds since the epoch
+def to_seconds(ts):
+    return datetime.fromisoformat(ts.replace('Z', '+00:00')).timestamp()
+
+
+# Function to format seconds since the epoch like the TS values written by the device
+def to_ts(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None).isoformat() + 'Z'
+
+
+# Sum over the last window_seconds kept in a fixed ring of buckets, so memory does not grow with the number of events
+class SlidingWindowCounter(object):
+
+    def __init__(self, window_seconds, buckets=24):
+        self.bucket_seconds = window_seconds / buckets
+        self.indices = [None] * buckets
+        self.sums = [0] * buckets
+
+    def add(self, seconds, value):
+        index = int(seconds // self.bucket_seconds)
+        slot = index % len(self.indices)
+        if self.indices[slot] != index:
+            if self.indices[slot] is not None and self.indices[slot] > index:
+                return  # Older than the window
+            self.indices[slot] = index
+            self.sums[slot] = 0
+        self.sums[slot] += value
+
+    def total(self, now):
+        current = int(now // self.bucket_seconds)
+        oldest = current - len(self.indices)
+        return sum(value for index, value in zip(self.indices, self.sums) if index is not None and oldest < index <= current)
+
+
+# Detection entities of one device read from its Azure table. TS is not indexed, so every poll reads a RowKey range
+# instead of scanning the table: capture RowKeys are YYYYMMDD-HHMMSS.jpg and heartbeat RowKeys heartbeat_<capture>
+class TableSource(object):
+
+    def __init__(self, table_client):
+        self.table_client = table_client
+        self.heartbeat_key = 'heartbeat_'  # Newest heartbeat seen; it is updated in place, so it is read again
+
+    def query(self, low, high, since):
+        return self.table_client.query_entities(
+            f"PartitionKey eq 'ImageDescription' and RowKey ge '{low}' and RowKey lt '{high}' and TS gt '{since}'",
+            select=['RowKey', 'TS', 'Weevil_number'])
+
+    def entities_since(self, since):
+        # Capture names use the device's local time and buffered captures are uploaded late, so start a day early
+        first_day = datetime.fromtimestamp(to_seconds(since) - 86400, timezone.utc).strftime('%Y%m%d')
+        captures = list(self.query(first_day, ':', since))  # ':' sorts right after the digits
+        heartbeats = list(self.query(self.heartbeat_key, 'heartbeat`', since))  # '`' sorts right after '_'
+        if heartbeats:
+            self.heartbeat_key = max(entity['RowKey'] for entity in heartbeats)
+        return sorted(captures + heartbeats, key=lambda x: x['TS'])
+
+
+# JSON lines file standing in for a device table; only lines appended since the last read are parsed
+class JsonlSource(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+
+    def entities_since(self, since):
+        if not os.path.exists(self.path):
+            return []
+        entities = []
+        with open(self.path) as f:
+            f.seek(self.offset)
+            for line in iter(f.readline, ''):
+                if not line.endswith("\n"):
+                    break  # Line still being written
+                self.offset = f.tell()
+                if line.strip():
+                    entity = json.loads(line)
+                    if entity['TS'] > since:
+                        entities.append(entity)
+        return sorted(entities, key=lambda x: x['TS'])
+
+
+# Alert records in an Azure table read by the dashboard
+class TableAlertSink(object):
+
+    def __init__(self, table_client):
+        self.table_client = table_client
+
+    def open_alerts(self):
+        return list(self.table_client.query_entities("Status eq 'active' or Status eq 'acknowledged'"))
+
+    def write(self, alert):
+        self.table_client.upsert_entity(entity=alert)
+
+
+# JSON lines file standing in for the alerts table
+class JsonlAlertSink(object):
+
+    def __init__(self, path):
+        self.path = path
+        self.alerts = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        alert = json.loads(line)
+                        self.alerts[(alert['PartitionKey'], alert['RowKey'])] = alert
+
+    def open_alerts(self):
+        return [alert for alert in self.alerts.values() if alert['Status'] in ('active', 'acknowledged')]
+
+    # Merge into the stored record, as upsert_entity does on the table
+    def write(self, alert):
+        key = (alert['PartitionKey'], alert['RowKey'])
+        self.alerts[key] = dict(self.alerts.get(key, {}), **alert)
+        with open(self.path, "w") as f:
+            for entry in self.alerts.values():
+                f.write(json.dumps(entry) + "\n")
+
+
+# Per-device counters updated as detections arrive; alert records are written only when a rule starts or stops firing.
+# An alert acknowledged on the dashboard stays open, so it is not raised again, until its rule stops firing
+class AlertEvaluator(object):
+
+    def __init__(self, sink, count_threshold=10, count_window_hours=24, quiet_hours=6):
+        self.sink = sink
+        self.count_threshold = count_threshold
+        self.count_window_hours = count_window_hours
+        self.count_window = count_window_hours * 3600
+        self.quiet_hours = quiet_hours
+        self.quiet_seconds = quiet_hours * 3600
+        self.counters = {}
+        self.last_seen = {}
+        self.active = {}
+        for alert in sink.open_alerts():
+            if alert['Rule'] in RULE_TITLES:
+                self.active[(alert['PartitionKey'], alert['Rule'])] = alert
+            else:
+                # Alerts of rules that no longer exist, such as the former DeviceSilent, are closed
+                sink.write({'PartitionKey': alert['PartitionKey'], 'RowKey': alert['RowKey'],
+                            'Status': 'resolved', 'ResolvedAt': to_ts(time.time())})
+
+    def add_device(self, device):
+        if device not in self.counters:
+            self.counters[device] = SlidingWindowCounter(self.count_window)
+            self.last_seen[device] = None
+
+    def consume(self, device, entity):
+        self.add_device(device)
+        seconds = to_seconds(entity['TS'])
+        self.counters[device].add(seconds, entity.get('Weevil_number') or 0)
+        if self.last_seen[device] is None or seconds > self.last_seen[device]:
+            self.last_seen[device] = seconds
+
+    def evaluate(self, now):
+        for device, counter in self.counters.items():
+            count = counter.total(now)
+            self.set_alert(device, RULE_COUNT_HIGH, count >= self.count_threshold, now, count,
+                           f"{count} weevils in the last {self.count_window_hours} h")
+
+            last_seen = self.last_seen[device]
+            quiet = now - last_seen if last_seen is not None else None
+            if quiet is None:
+                detail = f"No detections for more than {self.quiet_hours:g} h"
+            else:
+                detail = f"No detections for {quiet / 3600:.1f} h"
+            self.set_alert(device, RULE_QUIET, quiet is None or quiet >= self.quiet_seconds, now,
+                           round(quiet / 3600, 1) if quiet is not None else None, detail)
+
+    def set_alert(self, device, rule, firing, now, value, detail):
+        key = (device, rule)
+        alert = self.active.get(key)
+        if firing and alert is None:
+            title, severity = RULE_TITLES[rule]
+            if rule == RULE_QUIET:
+                title = f"{title} for {self.quiet_hours:g} h"
+            alert = {
+                'PartitionKey': device,
+                'RowKey': f"{rule}_{to_ts(now)}",
+                'Rule': rule,
+                'Title': title,
+                'Severity': severity,
+                'Status': 'active',
+                'RaisedAt': to_ts(now),
+                'Value': value,
+                'Detail': detail
+            }
+            if value is None:
+                del alert['Value']
+            self.sink.write(alert)
+            self.active[key] = alert
+            logging.info(f"Alert raised for {device}: {title} ({detail})")
+        elif not firing and alert is not None:
+            # Only the changed fields, so an acknowledgement written by the dashboard meanwhile is kept
+            alert = {'PartitionKey': device, 'RowKey': alert['RowKey'], 'Title': alert['Title'],
+                     'Status': 'resolved', 'ResolvedAt': to_ts(now), 'Detail': detail}
+            if value is not None:
+                alert['Value'] = value
+            self.sink.write(alert)
+            del self.active[key]
+            logging.info(f"Alert resolved for {device}: {alert['Title']}")
+
+
+# Function to poll every device for new detections and evaluate the rules after each round
+def run(sources, evaluator, interval=60, once=False):
+    # Replay enough history to fill the windows, so a restart needs no saved state
+    lookback = max(evaluator.count_window, evaluator.quiet_seconds)
+    watermarks = {device: to_ts(time.time() - lookback) for device in sources}
+    for device in sources:
+        evaluator.add_device(device)
+
+    while True:
+        for device, source in sources.items():
+            try:
+                entities = source.entities_since(watermarks[device])
+            except Exception as e:
+                logging.error(f"Error reading detections for {device}: {e}")
+                continue
+            for entity in entities:
+                evaluator.consume(device, entity)
+            if entities:
+                watermarks[device] = entities[-1]['TS']
+
+        try:
+            evaluator.evaluate(time.time())
+        except Exception as e:
+            logging.error(f"Error writing alerts: {e}")
+        if once:
+            return
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate alert rules incrementally as detection entities are written")
+    parser.add_argument("--device", action="append", default=None, help="Device table to watch (repeatable, default DeviceTest01)")
+    parser.add_argument("--alerts-table", default="Alerts")
+    parser.add_argument("--jsonl-dir", help="Use <device>.jsonl and <alerts-table>.jsonl in this directory instead of Azure tables")
+    parser.add_argument("--count-threshold", type=int, default=10)
+    parser.add_argument("--count-window-hours", type=float, default=24)
+    parser.add_argument("--quiet-hours", type=float, default=6, help="Hours without detections before a device is flagged")
+    parser.add_argument("--interval", type=float, default=60, help="Seconds between polls")
+    parser.add_argument("--once", action="store_true", help="Poll and evaluate once, then exit")
+    args = parser.parse_args()
+    devices = args.device or ['DeviceTest01']
+
+    if args.jsonl_dir:
+        sources = {device: JsonlSource(os.path.join(args.jsonl_dir, device + ".jsonl")) for device in devices}
+        sink = JsonlAlertSink(os.path.join(args.jsonl_dir, args.alerts_table + ".jsonl"))
+    else:
+        from azure.data.tables import TableServiceClient
+
+        # Load environment variables
+        load_dotenv()
+        table_service = TableServiceClient.from_connection_string(os.getenv("connection_string"))
+        alerts_client = table_service.get_table_client(args.alerts_table)
+        try:
+            alerts_client.create_table()
+        except Exception:
+            logging.info("Alerts table already exists")
+        sources = {device: TableSource(table_service.get_table_client(device)) for device in devices}
+        sink = TableAlertSink(alerts_client)
+
+    evaluator = AlertEvaluator(sink, args.count_threshold, args.count_window_hours, args.quiet_hours)
+    run(sources, evaluator, args.interval, args.once)
@@ -1,6 +1,9 @@
 import streamlit as st
 import os
-import matplotlib.pyplot as plt
+import io
+import json
+import hashlib
+from matplotlib.figure import Figure
 from azure.data.tables import TableServiceClient
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
@@ -13,10 +16,14 @@ connect_str = os.getenv("connection_string")
 table_service = TableServiceClient.from_connection_string(connect_str)
 table_client = table_service.get_table_client("DeviceTest01")
 
+# 告警记录由后端 alert_evaluator.py 写入
+alerts_client = table_service.get_table_client("Alerts")
+
 # 函数：按日期范围获取数据
 def get_data_by_date_range(start_date, end_date):
     query = f"TS ge '{start_date.isoformat()}Z' and TS lt '{end_date.isoformat()}Z'"
-    data = table_client.query_entities(query, select=['ImageUrl', 'Description', 'TS', 'Weevil_number'])
+    data = table_client.query_entities(query, select=['ImageUrl', 'Description', 'TS', 'Weevil_number',
+                                                      'UploadMode', 'Tiles', 'ImageWidth', 'ImageHeight', 'QuietCaptures'])
     return sorted(data, key=lambda x: x['TS'])
 
 # 函数：按月或日汇总数据
@@ -31,20 +38,114 @@ def aggregate_data(data, by='month'):
         aggregated[key] = aggregated.get(key, 0) + entry.get('Weevil_number', 0)
     return aggregated
 
+# 图表最多绘制的点数，超过时用 LTTB 降采样
+MAX_CHART_POINTS = 500
+MAX_CHART_TICKS = 12
+
+# 函数：LTTB（Largest-Triangle-Three-Buckets）降采样，返回保留点的下标，保留折线形状
+def lttb_indices(values, threshold):
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    indices = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+
+        # 下一个桶的平均点
+        avg_x = (end + next_end - 1) / 2
+        avg_y = sum(values[end:next_end]) / (next_end - end)
+
+        # 选取与上一个选中点和下一桶平均点构成最大三角形的点
+        max_area = -1
+        chosen = start
+        for j in range(start, end):
+            area = abs((a - avg_x) * (values[j] - values[a]) - (a - j) * (avg_y - values[a]))
+            if area > max_area:
+                max_area = area
+                chosen = j
+        indices.append(chosen)
+        a = chosen
+    indices.append(n - 1)
+    return indices
+
+# 函数：渲染折线图为 PNG，按聚合数据的哈希和视图模式缓存（下划线参数不参与缓存键）
+@st.cache_data(max_entries=32)
+def render_peaweevil_chart(chart_key, by, _timeline, _counts):
+    indices = lttb_indices(_counts, MAX_CHART_POINTS)
+
+    # 使用独立的 Figure 对象，不依赖全局 plt 状态，多会话并发时安全
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    ax.plot(indices, [_counts[i] for i in indices], marker='o' if len(indices) <= 100 else None, linestyle='-')
+    tick_step = max(1, len(indices) // MAX_CHART_TICKS)
+    tick_indices = indices[::tick_step]
+    ax.set_xticks(tick_indices)
+    ax.set_xticklabels([_timeline[i] for i in tick_indices], rotation=45)
+    ax.set_xlabel('Timeline')
+    ax.set_ylabel('Peaweevil Number')
+    ax.set_title(f'Peaweevil Detection Chart ({by.capitalize()})')
+    ax.grid(True)
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png')
+    return buffer.getvalue()
+
 # 函数：生成豌豆象检测折线图
 def generate_peaweevil_chart(data, by='month'):
     aggregated = aggregate_data(data, by)
+    if not aggregated:
+        st.write("No data to chart yet.")
+        return
     timeline = list(aggregated.keys())
     counts = list(aggregated.values())
 
-    plt.figure(figsize=(10, 6))
-    plt.plot(timeline, counts, marker='o', linestyle='-')
-    plt.xlabel('Timeline')
-    plt.ylabel('Peaweevil Number')
-    plt.title(f'Peaweevil Detection Chart ({by.capitalize()})')
-    plt.xticks(rotation=45)
-    plt.grid(True)
-    st.pyplot(plt)
+    # 对聚合结果取哈希作为缓存键，原地更新计数（如 backfill 不改 TS）也会重新渲染
+    chart_key = hashlib.sha1(json.dumps([timeline, counts], default=str).encode()).hexdigest()
+    st.image(render_peaweevil_chart(chart_key, by, timeline, counts))
+
+# 函数：重建图像视图（差分上传时把变化的图块叠加到关键帧上）
+def render_entry_image(entry):
+    image_url = entry.get('ImageUrl')
+    tiles = json.loads(entry.get('Tiles') or '[]')
+    if entry.get('UploadMode') != 'delta' or not tiles:
+        return f"<img src='{image_url}' width='100%' class='rounded-img'>"
+
+    width = entry['ImageWidth']
+    height = entry['ImageHeight']
+    overlays = "".join(
+        f"<img src='{tile['url']}' style='position: absolute; "
+        f"left: {100 * tile['x'] / width}%; top: {100 * tile['y'] / height}%; width: {100 * tile['w'] / width}%;'>"
+        for tile in tiles
+    )
+    return (
+        f"<div class='rounded-img' style='position: relative; overflow: hidden;'>"
+        f"<img src='{image_url}' width='100%' style='display: block;'>{overlays}"
+        f"</div>"
+    )
+
+# 函数：读取当前未解决的告警，读取失败时返回 None（不能当作没有告警）
+def get_active_alerts():
+    try:
+        alerts = alerts_client.query_entities("Status eq 'active'")
+        return sorted(alerts, key=lambda x: x['RaisedAt'], reverse=True)
+    except Exception as e:
+        st.error(f"Could not load warnings from the Alerts table: {e}")
+        return None
+
+# 函数：将告警标记为已确认（不再显示）；规则恢复正常后由 alert_evaluator 标记为已解决，避免重启后再次告警
+def acknowledge_alert(alert):
+    alerts_client.upsert_entity(entity={
+        'PartitionKey': alert['PartitionKey'],
+        'RowKey': alert['RowKey'],
+        'Status': 'acknowledged',
+        'AcknowledgedAt': datetime.utcnow().isoformat() + 'Z'
+    })
 
 # 函数：查找数据集中最早的时间
 def find_earliest_data():
@@ -146,11 +247,13 @@ with main_col:
             f"Pest category: Weevil<br>"
             f"Number: {entry['Weevil_number']}"
             )
+            if entry.get('UploadMode') == 'heartbeat':
+                description += f"<br>No change ({entry.get('QuietCaptures', 0)} quiet captures)"
 
 
             # Render image with the custom class and description below
             col.markdown(
-                f"<img src='{entry['ImageUrl']}' width='100%' class='rounded-img'><p>{description}</p>",
+                f"{render_entry_image(entry)}<p>{description}</p>",
                 unsafe_allow_html=True
             )
     else:
@@ -158,11 +261,15 @@ with main_col:
 
     # 警告列表
     st.write("### Warning List")
-    warnings = [{'title': 'Weevil count high', 'severity': 'High'}, {'title': 'Device disconnected', 'severity': 'Medium'}]
-    for warning in warnings:
-        severity_color = 'red' if warning['severity'] == 'High' else 'orange'
-        st.write(f"<span style='color:{severity_color};'>●</span> {warning['title']}", unsafe_allow_html=True)
-        st.checkbox(f"Mark as solved: {warning['title']}")
+    warnings = get_active_alerts()
+    if warnings is not None and not warnings:
+        st.write("No active warnings.")
+    for warning in warnings or []:
+        severity_color = 'red' if warning['Severity'] == 'High' else 'orange'
+        st.write(f"<span style='color:{severity_color};'>●</span> {warning['Title']} "
+                 f"({warning['PartitionKey']}, {warning.get('Detail', '')})", unsafe_allow_html=True)
+        if st.checkbox(f"Mark as solved: {warning['Title']}", key=f"{warning['PartitionKey']}_{warning['RowKey']}"):
+            acknowledge_alert(warning)
 
     # 专家建议区域
     st.write("### Expert Suggestions")